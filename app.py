@@ -13,12 +13,39 @@
 
 # The SQLite database is designed to include tables for users, project codes, and timesheets. Run the following script to initialize the database:
 
+import datetime
+import math
 import pandas as pd
 import streamlit as st
 import sqlite3
 
+PAGE_SIZE = 25
+
+# Timesheet dates are stored as date.toordinal(); adding this offset gives the Julian day
+# number SQLite's date functions expect
+ORDINAL_JULIAN_OFFSET = 1721424.5
+ORDINAL_TO_ISO = f"date({{}} + {ORDINAL_JULIAN_OFFSET})"
+
+def connect_db():
+    conn = sqlite3.connect('timesheets.db', check_same_thread=False, cached_statements=128)
+    # WAL lets readers run alongside a writer and, with synchronous=NORMAL, avoids an fsync per commit
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-64000')
+    return conn
+
+def get_conn():
+    # One connection per browser session, reused across reruns. Sessions run on separate
+    # threads, so sharing a connection between them would also share its open transaction
+    if "conn" not in st.session_state:
+        st.session_state.conn = connect_db()
+    return st.session_state.conn
+
+@st.cache_resource
 def init_db():
-    conn = sqlite3.connect('timesheets.db')
+    # Cached so the schema setup runs once per server process, not on every rerun
+    conn = connect_db()
     cursor = conn.cursor()
     
     # Create users table
@@ -40,7 +67,7 @@ def init_db():
                         id INTEGER PRIMARY KEY,
                         user_id INTEGER NOT NULL,
                         project_code_id INTEGER NOT NULL,
-                        date TEXT NOT NULL,
+                        date INTEGER NOT NULL,
                         hours REAL NOT NULL CHECK(hours >= 0),
                         status TEXT NOT NULL CHECK(status IN ('pending', 'approved', 'rejected')),
                         comments TEXT,
@@ -48,6 +75,24 @@ def init_db():
                         FOREIGN KEY(project_code_id) REFERENCES project_codes(id)
                       )''')
 
+    # Convert rows written as 'YYYY-MM-DD' text before dates were stored as ordinals
+    cursor.execute(f'''UPDATE timesheets SET date = CAST(julianday(date) - {ORDINAL_JULIAN_OFFSET} AS INTEGER)
+                      WHERE date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]' ''')
+
+    # Index the timesheet lookups by user and by status
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ts_user ON timesheets(user_id, status)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ts_status ON timesheets(status)')
+    # One entry per user, day and project code; lets creates upsert instead of duplicating.
+    # Older databases may already hold duplicates: keep a reviewed row over a pending one,
+    # then the lowest id, so the unique index can be built
+    cursor.execute('''DELETE FROM timesheets WHERE id IN (
+                        SELECT id FROM (
+                          SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id, date, project_code_id
+                                                        ORDER BY status = 'pending', id) AS rank
+                          FROM timesheets)
+                        WHERE rank > 1)''')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_ts_user_date_code ON timesheets(user_id, date, project_code_id)')
+
     conn.commit()
     conn.close()
 
@@ -63,29 +108,42 @@ init_db()
 #Utility functions to simplify database interactions:
 
 
-def run_query(query, params=None):
-    conn = sqlite3.connect('timesheets.db')
-    cursor = conn.cursor()
-    if params:
-        cursor.execute(query, params)
-    else:
-        cursor.execute(query)
-    conn.commit()
-    return cursor
+# Only entries still awaiting review are overwritten; approved or rejected rows are left
+# alone and the statement reports no change
+UPSERT_TIMESHEET = '''INSERT INTO timesheets (user_id, project_code_id, date, hours, status) VALUES (?, ?, ?, ?, ?)
+                      ON CONFLICT(user_id, date, project_code_id) DO UPDATE SET hours = excluded.hours, comments = NULL
+                      WHERE timesheets.status = 'pending' '''
+
+def execute_read(query, params=()):
+    # Reads never open a transaction, so there is nothing to commit
+    return get_conn().execute(query, params).fetchall()
 
-def fetch_query(query, params=None):
-    cursor = run_query(query, params)
-    return cursor.fetchall()
+def execute_write(query, params=()):
+    conn = get_conn()
+    with conn:
+        return conn.execute(query, params)
+
+def execute_many(query, seq_of_params):
+    conn = get_conn()
+    with conn:
+        return conn.executemany(query, seq_of_params)
 
 def get_project_codes():
-    return fetch_query('SELECT id, code FROM project_codes')
+    return execute_read('SELECT id, code FROM project_codes')
+
+@st.cache_data(ttl=60)
+def get_project_codes_cached():
+    # Project codes rarely change; the manager dashboard clears this after every edit.
+    # Cached as the code -> id map so reruns don't rebuild it
+    return {code: code_id for code_id, code in get_project_codes()}
 
 ### User Authentication
 
 #Basic authentication mechanism to identify users based on username and role:
 
+@st.cache_data(ttl=300)
 def authenticate(username, role):
-    user = fetch_query('SELECT id FROM users WHERE username = ? AND role = ?', (username, role))
+    user = execute_read('SELECT id FROM users WHERE username = ? AND role = ?', (username, role))
     return user[0][0] if user else None
 
 
@@ -97,11 +155,9 @@ def authenticate(username, role):
 
 def user_dashboard(user_id):
     st.title("User Dashboard")
-    # project_codes = [code[1] for code in get_project_codes()]
-    project_codes = get_project_codes()
-    project_code_map = {code[1]: code[0] for code in project_codes}
+    project_code_map = get_project_codes_cached()
 
-    selected_action = st.selectbox("What would you like to do?", ["Create Timesheet", "Modify Timesheet", "Delete Timesheet", "View Timesheets", "Respond to Comments"])
+    selected_action = st.selectbox("What would you like to do?", ["Create Timesheet", "Create Week", "Modify Timesheet", "Delete Timesheet", "View Timesheets", "Respond to Comments"])
 
     if selected_action == "Create Timesheet":
         with st.form("create_timesheet", clear_on_submit=True):
@@ -112,26 +168,55 @@ def user_dashboard(user_id):
 
             if submitted:
                 project_code_id = project_code_map[project_code]
-                run_query('INSERT INTO timesheets (user_id, project_code_id, date, hours, status) VALUES (?, ?, ?, ?, ?)',
-                (user_id, project_code_id, date.strftime('%Y-%m-%d'), hours, 'pending'))
+                cursor = execute_write(UPSERT_TIMESHEET, (user_id, project_code_id, date.toordinal(), hours, 'pending'))
+
+                if cursor.rowcount:
+                    st.success("Timesheet saved successfully!")
+                else:
+                    st.error(f"A timesheet for {project_code} on {date.strftime('%Y-%m-%d')} has already been reviewed")
+
+#### Creating a Week of Timesheets
 
-                st.success("Timesheet created successfully!")
+    elif selected_action == "Create Week":
+        # Outside the form so picking a new start date reruns and relabels the days below
+        start_date = st.date_input("Week Starting")
+        dates = [start_date + datetime.timedelta(days=i) for i in range(7)]
+        with st.form("create_week", clear_on_submit=True):
+            project_code = st.selectbox("Project Code", list(project_code_map.keys()))
+            hours = [st.number_input(f"Hours for {date.strftime('%a %Y-%m-%d')}", min_value=0.0, max_value=24.0, key=f"week_hours_{i}")
+                     for i, date in enumerate(dates)]
+            submitted = st.form_submit_button("Create")
+
+            if submitted:
+                project_code_id = project_code_map[project_code]
+                rows = [(user_id, project_code_id, date.toordinal(), hour, 'pending') for date, hour in zip(dates, hours) if hour > 0]
+                if rows:
+                    cursor = execute_many(UPSERT_TIMESHEET, rows)
+                    if cursor.rowcount:
+                        st.success(f"{cursor.rowcount} timesheets for the week saved successfully!")
+                    if cursor.rowcount < len(rows):
+                        st.error(f"{len(rows) - cursor.rowcount} days already have reviewed timesheets for {project_code} and were not changed")
+                else:
+                    st.warning("Enter hours for at least one day")
 
 #### Modifying Timesheets
 
     elif selected_action == "Modify Timesheet":
         timesheet_id = st.number_input("Enter Timesheet ID to Modify", min_value=1)
         with st.form("modify_timesheet", clear_on_submit=True):
-            project_code = st.selectbox("Project Code", project_codes)
+            project_code = st.selectbox("Project Code", list(project_code_map.keys()))
             date = st.date_input("Date")
             hours = st.number_input(f"Hours for {date.strftime('%Y-%m-%d')}", min_value=0.0, max_value=24.0, key="hours")
             submitted = st.form_submit_button("Modify")
 
             if submitted:
-                project_code_id = fetch_query('SELECT id FROM project_codes WHERE code = ?', (project_code,))[0][0]
-                run_query('UPDATE timesheets SET project_code_id = ?, date = ?, hours = ? WHERE id = ? AND user_id = ?',
-                          (project_code_id, date.strftime('%Y-%m-%d'), hours, timesheet_id, user_id))
-                st.success(f"Timesheet {timesheet_id} modified successfully")
+                project_code_id = project_code_map[project_code]
+                try:
+                    execute_write('UPDATE timesheets SET project_code_id = ?, date = ?, hours = ? WHERE id = ? AND user_id = ?',
+                                  (project_code_id, date.toordinal(), hours, timesheet_id, user_id))
+                    st.success(f"Timesheet {timesheet_id} modified successfully")
+                except sqlite3.IntegrityError:
+                    st.error(f"A timesheet for {project_code} on {date.strftime('%Y-%m-%d')} already exists")
 
 
 #### Deleting Timesheets
@@ -139,32 +224,39 @@ def user_dashboard(user_id):
     elif selected_action == "Delete Timesheet":
         timesheet_id = st.number_input("Enter Timesheet ID to Delete", min_value=1)
         if st.button("Delete"):
-            run_query('DELETE FROM timesheets WHERE id = ? AND user_id = ?', (timesheet_id, user_id))
+            execute_write('DELETE FROM timesheets WHERE id = ? AND user_id = ?', (timesheet_id, user_id))
             st.success(f"Timesheet {timesheet_id} deleted successfully")
 
 
 #### Viewing Timesheets
 
     elif selected_action == "View Timesheets":
-        timesheets = fetch_query('SELECT * FROM timesheets WHERE user_id = ?', (user_id,))
-        df = pd.DataFrame(timesheets, columns=["ID", "UserID", "Project Code", "Date", "Hours", "Status", "Comments"])
+        df = pd.read_sql_query(f'''SELECT t.id AS "ID", t.user_id AS "UserID", p.code AS "Project Code", {ORDINAL_TO_ISO.format("t.date")} AS "Date",
+                                         t.hours AS "Hours", t.status AS "Status", t.comments AS "Comments"
+                                  FROM timesheets t
+                                  LEFT JOIN project_codes p ON p.id = t.project_code_id
+                                  WHERE t.user_id = ?''', get_conn(), params=(user_id,))
         st.table(df)
 
 
 #### Responding to Manager Comments
 
     elif selected_action == "Respond to Comments":
-        timesheets = fetch_query('SELECT id, date, status, comments FROM timesheets WHERE user_id = ? AND status = "rejected"', (user_id,))
-        for timesheet in timesheets:
-            st.write(f"Timesheet ID: {timesheet[0]}")
-            st.write(f"Date: {timesheet[1]}")
-            st.write(f"Status: {timesheet[2]}")
-            st.write(f"Manager Comments: {timesheet[3]}")
-            modified_hours = st.number_input(f"New Hours for {timesheet[1]}", min_value=0.0, max_value=24.0, key=f"hours_{timesheet[0]}")
-            if st.button(f"Resubmit {timesheet[0]}", key=f"resubmit_{timesheet[0]}"):
-                run_query('UPDATE timesheets SET hours = ?, status = "pending" WHERE id = ?', (modified_hours, timesheet[0]))
-                st.success(f"Timesheet {timesheet[0]} resubmitted")
-
+        df = pd.read_sql_query(f'''SELECT id AS "ID", {ORDINAL_TO_ISO.format("date")} AS "Date", status AS "Status", comments AS "Manager Comments", hours AS "Hours"
+                                  FROM timesheets WHERE user_id = ? AND status = "rejected"''', get_conn(), params=(user_id,))
+        df["Resubmit"] = False
+        edited = st.data_editor(df, hide_index=True, disabled=["ID", "Date", "Status", "Manager Comments"],
+                                column_config={"Hours": st.column_config.NumberColumn("Hours", min_value=0.0, max_value=24.0, required=True)},
+                                key="respond_to_comments")
+        if st.button("Resubmit Selected"):
+            selected = edited[edited["Resubmit"]]
+            if selected.empty:
+                st.warning("Tick Resubmit on at least one timesheet first")
+            else:
+                # Only the ticked rows are written, and only while they are still this user's rejected entries
+                cursor = execute_many('UPDATE timesheets SET hours = ?, status = "pending" WHERE id = ? AND user_id = ? AND status = "rejected"',
+                                      [(hours, timesheet_id, user_id) for hours, timesheet_id in zip(selected["Hours"].tolist(), selected["ID"].tolist())])
+                st.success(f"{cursor.rowcount} timesheets resubmitted")
 
 ### Manager Dashboard
 
@@ -177,27 +269,49 @@ def manager_dashboard(manager_id):
     selected_action = st.selectbox("What would you like to do?", ["Review Timesheets", "Manage Project Codes", "Manage Users"])
 
     if selected_action == "Review Timesheets":
-        timesheets = fetch_query('SELECT * FROM timesheets WHERE status = "pending"')
-        for timesheet in timesheets:
-            st.write(f"Timesheet ID: {timesheet[0]}")
-            st.write(f"User ID: {timesheet[1]}")
-            st.write(f"Project Code ID: {timesheet[2]}")
-            st.write(f"Date: {timesheet[3]}")
-            st.write(f"Hours: {timesheet[4]}")
-            comments = st.text_area(f"Comments for Timesheet {timesheet[0]}")
-            if st.button(f"Approve {timesheet[0]}", key=f"approve_{timesheet[0]}"):
-                run_query('UPDATE timesheets SET status = "approved", comments = ? WHERE id = ?', (comments, timesheet[0]))
-                st.success(f"Timesheet {timesheet[0]} approved")
-            if st.button(f"Reject {timesheet[0]}", key=f"reject_{timesheet[0]}"):
-                run_query('UPDATE timesheets SET status = "rejected", comments = ? WHERE id = ?', (comments, timesheet[0]))
-                st.success(f"Timesheet {timesheet[0]} rejected")
+        pending_count = execute_read('SELECT COUNT(*) FROM timesheets WHERE status = "pending"')[0][0]
+        page = st.number_input("Page", min_value=1, max_value=max(1, math.ceil(pending_count / PAGE_SIZE)), value=1)
+        timesheets = execute_read(f'''SELECT t.id, u.username, p.code, {ORDINAL_TO_ISO.format("t.date")}, t.hours, t.status, t.comments
+                                    FROM timesheets t
+                                    LEFT JOIN users u ON u.id = t.user_id
+                                    LEFT JOIN project_codes p ON p.id = t.project_code_id
+                                    WHERE t.status = "pending"
+                                    ORDER BY t.id
+                                    LIMIT ? OFFSET ?''', (PAGE_SIZE, (page - 1) * PAGE_SIZE))
+        with st.form("review_timesheets"):
+            decisions = {}
+            for timesheet in timesheets:
+                st.write(f"Timesheet ID: {timesheet[0]}")
+                st.write(f"User: {timesheet[1]}")
+                st.write(f"Project Code: {timesheet[2]}")
+                st.write(f"Date: {timesheet[3]}")
+                st.write(f"Hours: {timesheet[4]}")
+                decision = st.radio(f"Decision for Timesheet {timesheet[0]}", ["pending", "approve", "reject"], horizontal=True, key=f"decision_{timesheet[0]}")
+                comments = st.text_area(f"Comments for Timesheet {timesheet[0]}", key=f"comments_{timesheet[0]}")
+                decisions[timesheet[0]] = (decision, comments)
+            submitted = st.form_submit_button("Submit Reviews")
 
+            if submitted:
+                statuses = {"approve": "approved", "reject": "rejected"}
+                reviews = [(timesheet_id, statuses[decision], comments)
+                           for timesheet_id, (decision, comments) in decisions.items() if decision in statuses]
+                if reviews:
+                    # One UPDATE for the whole page: CASE picks each row's status and comments by id
+                    whens = " ".join(["WHEN ? THEN ?"] * len(reviews))
+                    placeholders = ", ".join(["?"] * len(reviews))
+                    # Rows another manager already reviewed since this page loaded are left untouched
+                    cursor = execute_write(f'UPDATE timesheets SET status = CASE id {whens} END, comments = CASE id {whens} END WHERE id IN ({placeholders}) AND status = "pending"',
+                                           [value for timesheet_id, status, _ in reviews for value in (timesheet_id, status)]
+                                           + [value for timesheet_id, _, comments in reviews for value in (timesheet_id, comments)]
+                                           + [timesheet_id for timesheet_id, _, _ in reviews])
+                    st.success(f"{cursor.rowcount} timesheets reviewed")
+                else:
+                    st.info("No timesheets were approved or rejected")
 
 #### Managing Project Codes
 
     elif selected_action == "Manage Project Codes":
-        project_codes = fetch_query('SELECT * FROM project_codes')
-        st.table(pd.DataFrame(project_codes, columns=["ID", "Code", "Description"]))
+        st.table(pd.read_sql_query('SELECT id AS "ID", code AS "Code", description AS "Description" FROM project_codes', get_conn()))
 
         with st.form("manage_project_codes", clear_on_submit=True):
             action = st.selectbox("Action", ["Create", "Modify", "Delete"])
@@ -211,21 +325,23 @@ def manager_dashboard(manager_id):
             submitted = st.form_submit_button(f"{action} Project Code")
             if submitted:
                 if action == "Create":
-                    run_query('INSERT INTO project_codes (code, description) VALUES (?, ?)', (code, description))
+                    execute_write('INSERT INTO project_codes (code, description) VALUES (?, ?)', (code, description))
+                    get_project_codes_cached.clear()
                     st.success("Project Code created successfully!")
                 elif action == "Modify" and project_code_id:
-                    run_query('UPDATE project_codes SET code = ?, description = ? WHERE id = ?', (code, description, project_code_id))
+                    execute_write('UPDATE project_codes SET code = ?, description = ? WHERE id = ?', (code, description, project_code_id))
+                    get_project_codes_cached.clear()
                     st.success(f"Project Code {project_code_id} modified successfully")
                 elif action == "Delete" and project_code_id:
-                    run_query('DELETE FROM project_codes WHERE id = ?', (project_code_id,))
+                    execute_write('DELETE FROM project_codes WHERE id = ?', (project_code_id,))
+                    get_project_codes_cached.clear()
                     st.success(f"Project Code {project_code_id} deleted successfully")
 
 
 #### Managing Users
 
     elif selected_action == "Manage Users":
-        users = fetch_query('SELECT * FROM users')
-        st.table(pd.DataFrame(users, columns=["ID", "Username", "Role"]))
+        st.table(pd.read_sql_query('SELECT id AS "ID", username AS "Username", role AS "Role" FROM users', get_conn()))
 
         with st.form("manage_users", clear_on_submit=True):
             action = st.selectbox("Action", ["Create", "Modify", "Delete"])
@@ -239,13 +355,16 @@ def manager_dashboard(manager_id):
             submitted = st.form_submit_button(f"{action} User")
             if submitted:
                 if action == "Create":
-                    run_query('INSERT INTO users (username, role) VALUES (?, ?)', (username, role))
+                    execute_write('INSERT INTO users (username, role) VALUES (?, ?)', (username, role))
+                    authenticate.clear()
                     st.success("User created successfully!")
                 elif action == "Modify" and user_id:
-                    run_query('UPDATE users SET username = ?, role = ? WHERE id = ?', (username, role, user_id))
+                    execute_write('UPDATE users SET username = ?, role = ? WHERE id = ?', (username, role, user_id))
+                    authenticate.clear()
                     st.success(f"User {username} modified successfully")
                 elif action == "Delete" and user_id:
-                    run_query('DELETE FROM users WHERE id = ?', (user_id,))
+                    execute_write('DELETE FROM users WHERE id = ?', (user_id,))
+                    authenticate.clear()
                     st.success(f"User {username} deleted successfully")
 
 
@@ -0,0 +1,41 @@
+import sqlite3
+from pathlib import Path
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+APP = str(Path(__file__).resolve().parent.parent / "app.py")
+
+LEGACY_TIMESHEETS = '''CREATE TABLE timesheets (
+                        id INTEGER PRIMARY KEY,
+                        user_id INTEGER NOT NULL,
+                        project_code_id INTEGER NOT NULL,
+                        date TEXT NOT NULL,
+                        hours REAL NOT NULL CHECK(hours >= 0),
+                        status TEXT NOT NULL CHECK(status IN ('pending', 'approved', 'rejected')),
+                        comments TEXT
+                      )'''
+
+
+def test_init_db_upgrades_legacy_db_with_duplicates(tmp_path, monkeypatch):
+    conn = sqlite3.connect(tmp_path / "timesheets.db")
+    conn.execute(LEGACY_TIMESHEETS)
+    conn.executemany('INSERT INTO timesheets (id, user_id, project_code_id, date, hours, status) VALUES (?, ?, ?, ?, ?, ?)',
+                     [(1, 3, 1, '2024-06-05', 4.0, 'pending'),
+                      (2, 3, 1, '2024-06-05', 6.0, 'approved'),
+                      (3, 3, 1, '2024-06-06', 2.0, 'pending'),
+                      (4, 3, 1, '2024-06-06', 3.0, 'pending'),
+                      (5, 4, 1, '2024-06-06', 1.0, 'pending')])
+    conn.commit()
+    conn.close()
+
+    monkeypatch.chdir(tmp_path)
+    st.cache_resource.clear()
+    at = AppTest.from_file(APP).run()
+    assert not at.exception
+
+    conn = sqlite3.connect(tmp_path / "timesheets.db")
+    # The reviewed duplicate wins over the pending one, otherwise the lowest id is kept
+    assert [row[0] for row in conn.execute('SELECT id FROM timesheets ORDER BY id')] == [2, 3, 5]
+    assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_ts_user_date_code'").fetchone()
+    conn.close()